@@ -4,6 +4,7 @@
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 """Test node responses to invalid network messages."""
 
+from concurrent.futures import ThreadPoolExecutor
 import struct
 import time
 
@@ -39,7 +40,7 @@ class msg_unrecognized:
     msgtype = b'badmsg'
 
     def __init__(self, *, str_data):
-        self.str_data = str_data.encode() if not isinstance(str_data, bytes) else str_data
+        self.str_data = str_data
 
     def serialize(self):
         return ser_string(self.str_data)
@@ -60,98 +61,110 @@ class InvalidMessagesTest(BitcoinTestFramework):
         self.extra_args = [["-whitelist=addr@127.0.0.1"]]
 
     def run_test(self):
-        self.test_buffer()
-        self.test_magic_bytes()
-        self.test_checksum()
-        self.test_size()
-        self.test_msgtype()
-        self.test_addrv2_empty()
-        self.test_addrv2_no_addresses()
-        self.test_addrv2_too_long_address()
-        self.test_addrv2_unrecognized_network()
-        self.test_oversized_inv_msg()
-        self.test_oversized_getdata_msg()
-        self.test_oversized_headers_msg()
+        # Subtests that do not expect to be disconnected share a connection,
+        # instead of each tearing down and re-establishing its own.
+        conn = self.nodes[0].add_p2p_connection(P2PDataStore())
+        self.test_buffer(conn)
+        self.test_checksum(conn)
+        self.test_msgtype(conn)
+        self.nodes[0].disconnect_p2ps()
+
+        # These subtests each use their own connection and only wait on p2p
+        # events and the debug log, so they can run concurrently. Subtests
+        # that make RPC calls stay serial, as the RPC connection is not
+        # thread-safe.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.test_magic_bytes), executor.submit(self.test_size)]
+            for future in futures:
+                future.result()
+        self.nodes[0].disconnect_p2ps()
+
+        conn = self.nodes[0].add_p2p_connection(SenderOfAddrV2())
+        # Make sure bitcoind signals support for ADDRv2, otherwise this test
+        # will bombard an old node with messages it does not recognize which
+        # will produce unexpected results.
+        conn.wait_for_sendaddrv2()
+        self.test_addrv2_empty(conn)
+        self.test_addrv2_no_addresses(conn)
+        self.test_addrv2_too_long_address(conn)
+        self.test_addrv2_unrecognized_network(conn)
+        self.nodes[0].disconnect_p2ps()
+
+        # Each oversized message scores 20 misbehavior points, so all three
+        # stay below the discouragement threshold on a single connection.
+        conn = self.nodes[0].add_p2p_connection(P2PInterface())
+        self.test_oversized_inv_msg(conn)
+        self.test_oversized_getdata_msg(conn)
+        self.test_oversized_headers_msg(conn)
+        self.nodes[0].disconnect_p2ps()
+
         self.test_resource_exhaustion()
 
-    def test_buffer(self):
+    def test_buffer(self, conn):
         self.log.info("Test message with header split across two buffers is received")
-        conn = self.nodes[0].add_p2p_connection(P2PDataStore())
         # Create valid message
         msg = conn.build_message(msg_ping(nonce=12345))
         cut_pos = 12  # Chosen at an arbitrary position within the header
         # Send message in two pieces
-        before = self.nodes[0].getnettotals()['totalbytesrecv']
+        expected = self.nodes[0].getnettotals()['totalbytesrecv'] + cut_pos
         conn.send_raw_message(msg[:cut_pos])
         # Wait until node has processed the first half of the message
-        self.wait_until(lambda: self.nodes[0].getnettotals()['totalbytesrecv'] != before)
+        self.wait_until(lambda: self.nodes[0].getnettotals()['totalbytesrecv'] >= expected)
         middle = self.nodes[0].getnettotals()['totalbytesrecv']
         # If this assert fails, we've hit an unlikely race
         # where the test framework sent a message in between the two halves
-        assert_equal(middle, before + cut_pos)
+        assert_equal(middle, expected)
         conn.send_raw_message(msg[cut_pos:])
         conn.sync_with_ping(timeout=1)
-        self.nodes[0].disconnect_p2ps()
 
     def test_magic_bytes(self):
         self.log.info("Test message with invalid magic bytes disconnects peer")
         conn = self.nodes[0].add_p2p_connection(P2PDataStore())
         with self.nodes[0].assert_debug_log(['HEADER ERROR - MESSAGESTART (badmsg, 2 bytes), received ffffffff']):
-            msg = conn.build_message(msg_unrecognized(str_data="d"))
+            msg = conn.build_message(msg_unrecognized(str_data=b"d"))
             # modify magic bytes
             msg = b'\xff' * 4 + msg[4:]
             conn.send_raw_message(msg)
             conn.wait_for_disconnect(timeout=1)
-        self.nodes[0].disconnect_p2ps()
 
-    def test_checksum(self):
+    def test_checksum(self, conn):
         self.log.info("Test message with invalid checksum logs an error")
-        conn = self.nodes[0].add_p2p_connection(P2PDataStore())
+        other_before = self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg'].get('*other*', 0)
         with self.nodes[0].assert_debug_log(['CHECKSUM ERROR (badmsg, 2 bytes), expected 78df0a04 was ffffffff']):
-            msg = conn.build_message(msg_unrecognized(str_data="d"))
+            msg = bytearray(conn.build_message(msg_unrecognized(str_data=b"d")))
             # Checksum is after start bytes (4B), message type (12B), len (4B)
             cut_len = 4 + 12 + 4
             # modify checksum
-            msg = msg[:cut_len] + b'\xff' * 4 + msg[cut_len + 4:]
-            conn.send_raw_message(msg)
+            msg[cut_len:cut_len + 4] = b'\xff' * 4
+            conn.send_raw_message(bytes(msg))
             conn.sync_with_ping(timeout=1)
         # Check that traffic is accounted for (24 bytes header + 2 bytes payload)
-        assert_equal(self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg']['*other*'], 26)
-        self.nodes[0].disconnect_p2ps()
+        assert_equal(self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg']['*other*'], other_before + 26)
 
     def test_size(self):
         self.log.info("Test message with oversized payload disconnects peer")
         conn = self.nodes[0].add_p2p_connection(P2PDataStore())
         with self.nodes[0].assert_debug_log(['HEADER ERROR - SIZE (badmsg, 4000001 bytes)']):
-            msg = msg_unrecognized(str_data="d" * (VALID_DATA_LIMIT + 1))
+            msg = msg_unrecognized(str_data=b"d" * (VALID_DATA_LIMIT + 1))
             msg = conn.build_message(msg)
             conn.send_raw_message(msg)
             conn.wait_for_disconnect(timeout=1)
-        self.nodes[0].disconnect_p2ps()
 
-    def test_msgtype(self):
+    def test_msgtype(self, conn):
         self.log.info("Test message with invalid message type logs an error")
-        conn = self.nodes[0].add_p2p_connection(P2PDataStore())
+        other_before = self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg'].get('*other*', 0)
         with self.nodes[0].assert_debug_log(['HEADER ERROR - COMMAND']):
-            msg = msg_unrecognized(str_data="d")
-            msg = conn.build_message(msg)
+            msg = msg_unrecognized(str_data=b"d")
+            msg = bytearray(conn.build_message(msg))
             # Modify msgtype
-            msg = msg[:7] + b'\x00' + msg[7 + 1:]
-            conn.send_raw_message(msg)
+            msg[7] = 0
+            conn.send_raw_message(bytes(msg))
             conn.sync_with_ping(timeout=1)
         # Check that traffic is accounted for (24 bytes header + 2 bytes payload)
-        assert_equal(self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg']['*other*'], 26)
-        self.nodes[0].disconnect_p2ps()
+        assert_equal(self.nodes[0].getpeerinfo()[0]['bytesrecv_per_msg']['*other*'], other_before + 26)
 
-    def test_addrv2(self, label, required_log_messages, raw_addrv2):
+    def test_addrv2(self, conn, label, required_log_messages, raw_addrv2):
         node = self.nodes[0]
-        conn = node.add_p2p_connection(SenderOfAddrV2())
-
-        # Make sure bitcoind signals support for ADDRv2, otherwise this test
-        # will bombard an old node with messages it does not recognize which
-        # will produce unexpected results.
-        conn.wait_for_sendaddrv2()
-
         self.log.info('Test addrv2: ' + label)
 
         msg = msg_unrecognized(str_data=b'')
@@ -162,10 +175,8 @@ class InvalidMessagesTest(BitcoinTestFramework):
             conn.send_raw_message(conn.build_message(msg))
             conn.sync_with_ping()
 
-        node.disconnect_p2ps()
-
-    def test_addrv2_empty(self):
-        self.test_addrv2('empty',
+    def test_addrv2_empty(self, conn):
+        self.test_addrv2(conn, 'empty',
             [
                 'received: addrv2 (0 bytes)',
                 'ProcessMessages(addrv2, 0 bytes): Exception',
@@ -173,15 +184,15 @@ class InvalidMessagesTest(BitcoinTestFramework):
             ],
             b'')
 
-    def test_addrv2_no_addresses(self):
-        self.test_addrv2('no addresses',
+    def test_addrv2_no_addresses(self, conn):
+        self.test_addrv2(conn, 'no addresses',
             [
                 'received: addrv2 (1 bytes)',
             ],
             hex_str_to_bytes('00'))
 
-    def test_addrv2_too_long_address(self):
-        self.test_addrv2('too long address',
+    def test_addrv2_too_long_address(self, conn):
+        self.test_addrv2(conn, 'too long address',
             [
                 'received: addrv2 (525 bytes)',
                 'ProcessMessages(addrv2, 525 bytes): Exception',
@@ -196,9 +207,9 @@ class InvalidMessagesTest(BitcoinTestFramework):
                 'ab' * 513 + # address
                 '208d'))     # port
 
-    def test_addrv2_unrecognized_network(self):
+    def test_addrv2_unrecognized_network(self, conn):
         now_hex = struct.pack('<I', int(time.time())).hex()
-        self.test_addrv2('unrecognized network',
+        self.test_addrv2(conn, 'unrecognized network',
             [
                 'received: addrv2 (25 bytes)',
                 'IP 9.9.9.9 mapped',
@@ -221,35 +232,37 @@ class InvalidMessagesTest(BitcoinTestFramework):
                 '09' * 4 + # address
                 '208d'))   # port
 
-    def test_oversized_msg(self, msg, size):
+    def test_oversized_msg(self, conn, msg, size):
         msg_type = msg.msgtype.decode('ascii')
         self.log.info("Test {} message of size {} is logged as misbehaving".format(msg_type, size))
         with self.nodes[0].assert_debug_log(['Misbehaving', '{} message size = {}'.format(msg_type, size)]):
-            self.nodes[0].add_p2p_connection(P2PInterface()).send_and_ping(msg)
-        self.nodes[0].disconnect_p2ps()
+            conn.send_and_ping(msg)
 
-    def test_oversized_inv_msg(self):
+    def test_oversized_inv_msg(self, conn):
         size = MAX_INV_SIZE + 1
-        self.test_oversized_msg(msg_inv([CInv(MSG_TX, 1)] * size), size)
+        self.test_oversized_msg(conn, msg_inv([CInv(MSG_TX, 1)] * size), size)
 
-    def test_oversized_getdata_msg(self):
+    def test_oversized_getdata_msg(self, conn):
         size = MAX_INV_SIZE + 1
-        self.test_oversized_msg(msg_getdata([CInv(MSG_TX, 1)] * size), size)
+        self.test_oversized_msg(conn, msg_getdata([CInv(MSG_TX, 1)] * size), size)
 
-    def test_oversized_headers_msg(self):
+    def test_oversized_headers_msg(self, conn):
         size = MAX_HEADERS_RESULTS + 1
-        self.test_oversized_msg(msg_headers([CBlockHeader()] * size), size)
+        self.test_oversized_msg(conn, msg_headers([CBlockHeader()] * size), size)
 
     def test_resource_exhaustion(self):
         self.log.info("Test node stays up despite many large junk messages")
         conn = self.nodes[0].add_p2p_connection(P2PDataStore())
         conn2 = self.nodes[0].add_p2p_connection(P2PDataStore())
-        msg_at_size = msg_unrecognized(str_data="b" * VALID_DATA_LIMIT)
+        msg_at_size = msg_unrecognized(str_data=b"b" * VALID_DATA_LIMIT)
         assert len(msg_at_size.serialize()) == MAX_PROTOCOL_MESSAGE_LENGTH
 
         self.log.info("(a) Send 80 messages, each of maximum valid data size (4MB)")
+        # Frame the message once, so that the 4MB payload is not re-serialized
+        # and re-hashed for every send
+        framed_msg = conn.build_message(msg_at_size)
         for _ in range(80):
-            conn.send_message(msg_at_size)
+            conn.send_raw_message(framed_msg)
 
         # Check that, even though the node is being hammered by nonsense from one
         # connection, it can still service other peers in a timely way.
@@ -28,21 +28,22 @@ class AddressType(enum.Enum):
 
 chars = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
 
+_VALID_KEY_LENS = frozenset({33, 65})  # compressed and uncompressed pubkeys
+
 
 def byte_to_base58(b, version):
-    result = ''
-    str = b.hex()
-    str = chr(version).encode('latin-1').hex() + str
-    checksum = hash256(hex_str_to_bytes(str)).hex()
-    str += checksum[:8]
-    value = int('0x' + str, 0)
+    # Assemble version, payload and checksum in a single preallocated buffer
+    data = bytearray(1 + len(b) + 4)
+    data[0] = version
+    data[1:-4] = b
+    data[-4:] = hash256(data[:-4])[:4]
+    value = int.from_bytes(data, 'big')
+    result = []
     while value > 0:
-        result = chars[value % 58] + result
-        value //= 58
-    while (str[:2] == '00'):
-        result = chars[0] + result
-        str = str[2:]
-    return result
+        value, digit = divmod(value, 58)
+        result.append(chars[digit])
+    pad = len(data) - len(data.lstrip(b'\x00'))
+    return chars[0] * pad + ''.join(reversed(result))
 
 
 def base58_to_byte(s):
@@ -122,14 +123,14 @@ def script_to_p2sh_p2wsh(script, main=False):
 def check_key(key):
     if (type(key) is str):
         key = hex_str_to_bytes(key)  # Assuming this is hex string
-    if (type(key) is bytes and (len(key) == 33 or len(key) == 65)):
+    if (type(key) is bytes and len(key) in _VALID_KEY_LENS):
         return key
     assert False
 
 def check_script(script):
     if (type(script) is str):
         script = hex_str_to_bytes(script)  # Assuming this is hex string
-    if (type(script) is bytes or type(script) is CScript):
+    if (type(script) in (bytes, CScript)):
         return script
     assert False
 
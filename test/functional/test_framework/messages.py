@@ -210,13 +210,13 @@ def deser_vector(f, c, deser_function_name=None):
 # entries in the vector (we use this for serializing the vector of transactions
 # for a witness block).
 def ser_vector(l, ser_function_name=None):
-    r = ser_compact_size(len(l))
-    for i in l:
-        if ser_function_name:
-            r += getattr(i, ser_function_name)()
-        else:
-            r += i.serialize()
-    return r
+    # Join the parts once at the end; repeated bytes concatenation is
+    # quadratic in the vector length (e.g. 50k-entry inv messages).
+    if ser_function_name:
+        parts = [getattr(i, ser_function_name)() for i in l]
+    else:
+        parts = [i.serialize() for i in l]
+    return ser_compact_size(len(l)) + b"".join(parts)
 
 
 def deser_uint256_vector(f):
@@ -761,8 +761,9 @@ class CBlockHeader:
             r += struct.pack("<I", self.nTime)
             r += struct.pack("<I", self.nBits)
             r += struct.pack("<I", self.nNonce)
-            self.sha256 = uint256_from_str(hash256(r))
-            self.hash = encode(hash256(r)[::-1], 'hex_codec').decode('ascii')
+            h = hash256(r)
+            self.sha256 = uint256_from_str(h)
+            self.hash = encode(h[::-1], 'hex_codec').decode('ascii')
             self.scrypt256 = uint256_from_str(litecoin_scrypt.getPoWHash(r))
 
     def rehash(self):
@@ -854,9 +855,18 @@ class CBlock(CBlockHeader):
     def solve(self):
         self.rehash()
         target = uint256_from_compact(self.nBits)
-        while self.scrypt256 > target:
+        if self.scrypt256 <= target:
+            return
+        # Serialize the header once and only patch the nonce (the last 4 bytes)
+        # in place for each attempt, instead of rebuilding and double-hashing
+        # the full header on every iteration.
+        header = bytearray(CBlockHeader.serialize(self))
+        while True:
             self.nNonce += 1
-            self.rehash()
+            struct.pack_into("<I", header, 76, self.nNonce)
+            if uint256_from_str(litecoin_scrypt.getPoWHash(bytes(header))) <= target:
+                break
+        self.rehash()
 
     def __repr__(self):
         return "CBlock(nVersion=%i hashPrevBlock=%064x hashMerkleRoot=%064x nTime=%s nBits=%08x nNonce=%08x vtx=%s)" \
@@ -16,15 +16,26 @@ class Encoding(Enum):
     BECH32M = 2
 
 
+def bech32_polymod_table():
+    """Precompute the XOR of the generator values selected by each 5-bit top value."""
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    table = []
+    for top in range(32):
+        entry = 0
+        for i in range(5):
+            entry ^= generator[i] if ((top >> i) & 1) else 0
+        table.append(entry)
+    return table
+
+BECH32_POLYMOD_TABLE = bech32_polymod_table()
+
+
 def bech32_polymod(values):
     """Internal function that computes the Bech32 checksum."""
-    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    table = BECH32_POLYMOD_TABLE
     chk = 1
     for value in values:
-        top = chk >> 25
-        chk = (chk & 0x1ffffff) << 5 ^ value
-        for i in range(5):
-            chk ^= generator[i] if ((top >> i) & 1) else 0
+        chk = (chk & 0x1ffffff) << 5 ^ value ^ table[chk >> 25]
     return chk
 
 
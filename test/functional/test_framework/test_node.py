@@ -373,23 +373,27 @@ class TestNode():
 
         yield
 
-        while True:
-            found = True
-            with open(debug_log, encoding='utf-8') as dl:
-                dl.seek(prev_size)
-                log = dl.read()
-            print_log = " - " + "\n - ".join(log.splitlines())
-            for unexpected_msg in unexpected_msgs:
-                if re.search(re.escape(unexpected_msg), log, flags=re.MULTILINE):
-                    self._raise_assertion_error('Unexpected message "{}" partially matches log:\n\n{}\n\n'.format(unexpected_msg, print_log))
-            for expected_msg in expected_msgs:
-                if re.search(re.escape(expected_msg), log, flags=re.MULTILINE) is None:
-                    found = False
-            if found:
-                return
-            if time.time() >= time_end:
-                break
-            time.sleep(0.05)
+        # Keep the file open across polls and only read what was appended
+        # since the previous poll, rather than re-reading from prev_size.
+        log = ""
+        with open(debug_log, encoding='utf-8') as dl:
+            dl.seek(prev_size)
+            while True:
+                found = True
+                log += dl.read()
+                for unexpected_msg in unexpected_msgs:
+                    if re.search(re.escape(unexpected_msg), log, flags=re.MULTILINE):
+                        print_log = " - " + "\n - ".join(log.splitlines())
+                        self._raise_assertion_error('Unexpected message "{}" partially matches log:\n\n{}\n\n'.format(unexpected_msg, print_log))
+                for expected_msg in expected_msgs:
+                    if re.search(re.escape(expected_msg), log, flags=re.MULTILINE) is None:
+                        found = False
+                if found:
+                    return
+                if time.time() >= time_end:
+                    break
+                time.sleep(0.05)
+        print_log = " - " + "\n - ".join(log.splitlines())
         self._raise_assertion_error('Expected messages "{}" does not partially match log:\n\n{}\n\n'.format(str(expected_msgs), print_log))
 
     @contextlib.contextmanager